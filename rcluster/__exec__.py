@@ -9,30 +9,43 @@
 * Terminate an R cluster
 """
 
+import shutil
 import argparse
 import webbrowser
 import logging
 
 import rcluster as rcl
 
-parser = argparse.ArgumentParser()
+parser = argparse.ArgumentParser(add_help=False)
 parser.add_argument('-d', '--debug', help="Print lots of debugging statements",
                     action="store_const", dest="loglevel", const=logging.DEBUG,
                     default=logging.WARNING)
 parser.add_argument('-v', '--verbose', help="Be verbose",
                     action="store_const", dest="loglevel", const=logging.INFO)
 
+_config_file_parser = argparse.ArgumentParser(add_help=False)
+_config_file_parser.add_argument('-c', '--config', type=str,
+                                 default=rcl._set_data('json'),
+                                 help='The JSON RCluster configuration file.')
+
+_main_parser = argparse.ArgumentParser(parents=[parser, _config_file_parser])
+_main_parser.add_argument('-w', '--workers', type=int, default=1,
+                          help='The number of workers to launch.')
+_main_parser.add_argument('-t', '--type', type=str, default='m4.large',
+                          help='The instance type to use.')
+
+_setup_parser = argparse.ArgumentParser(parents=[parser])
+_setup_parser.add_argument('-o', '--outfile', type=str,
+                           default=rcl._set_data('json'),
+                           help='The file in which to save the RCluster ' +
+                                'configuration data (stored in JSON format)')
+
+_cluster_parser = argparse.ArgumentParser(parents=[parser, _config_file_parser])
+
 
 def main():
     """Launch an RCluster using the information saved to a configuration file"""
-    parser.add_argument('-w', '--workers', type=int, nargs=1, default=[1],
-                        help='The number of workers to launch.')
-    parser.add_argument('-t', '--type', type=str, nargs=1, default='m4.large',
-                        help='The instance type to use.')
-    parser.add_argument('-c', '--config', type=str, nargs=1,
-                        default=rcl._set_data('json'),
-                        help='The JSON RCluster configuration file.')
-    args = parser.parse_args()
+    args = _main_parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     log = logging.getLogger()
 
@@ -48,7 +61,7 @@ def main():
                  "Run `rcluster-terminate` to remove the previous cluster.\n"
                  "Returning current manager instance.\n")
     else:
-        cluster.create_cluster(args.workers[0], InstanceType=args.type)
+        cluster.create_cluster(args.workers, InstanceType=args.type)
         ip = cluster.access_ip
     _open_ip(ip)
     cl_data = ('Manager IP Address:', ip)
@@ -72,12 +85,7 @@ def config():
     installed, and saves out the configuration file with credentials to a hidden
     folder in the user's home directory.
     """
-    import shutil
-    parser.add_argument('-o', '--outfile', type=str, nargs=1,
-                        default=rcl._set_data('json'),
-                        help='The file in which to save the RCluster' +
-                             'configuration data (stored in JSON format)')
-    args = parser.parse_args()
+    args = _setup_parser.parse_args()
     logging.basicConfig(level=args.loglevel)
 
     setup_cl = rcl.RCluster.from_config(rcl._get_data('config.json'), purge=True)
@@ -100,10 +108,7 @@ def terminate():
     Terminate all AWS instances associated with the specified RCluster
     configuration file.
     """
-    parser.add_argument('-c', '--config', type=str, nargs=1,
-                        default=rcl._set_data('json'),
-                        help='The JSON RCluster configuration file.')
-    args = parser.parse_args()
+    args = _cluster_parser.parse_args()
     logging.basicConfig(level=args.loglevel)
 
     cluster = rcl.RCluster.from_config(args.config)
@@ -115,10 +120,7 @@ def retrieve_cluster():
     Retrieve the access IP address of the current manager instance (if live).
     Also opens a browser to the manager's RStudio Server.
     """
-    parser.add_argument('-c', '--config', type=str, nargs=1,
-                        default=rcl._set_data('json'),
-                        help='The JSON RCluster configuration file.')
-    args = parser.parse_args()
+    args = _cluster_parser.parse_args()
     logging.basicConfig(level=args.loglevel)
     log = logging.getLogger()
 
@@ -15,21 +15,23 @@ Command line tools include:
 
 import os
 import logging
+from functools import lru_cache
 
-__title__ = 'rcluster'
-__ver__ = '0.2.27'
+from ._version import __title__, __ver__
 
 # Add logging (defaults to null, but can be picked up by any logger)
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 # Identify user's home directory, create hidden folder
-_OUTDIR = os.path.join(os.path.expanduser('~'), '.rcluster')
+_HOME = os.path.expanduser('~')
+_OUTDIR = os.path.join(_HOME, '.rcluster')
 os.makedirs(_OUTDIR, exist_ok=True)
 
 # Identify location of rcluster installation
 _ROOT = os.path.abspath(os.path.dirname(__file__))
 
 
+@lru_cache(maxsize=None)
 def _set_data(ext):
     """
     Return path to save a file to hidden ``.rcluster`` folder in user directory.
@@ -40,6 +42,7 @@ def _set_data(ext):
     return os.path.join(_OUTDIR, __ver__ + '.' + ext)
 
 
+@lru_cache(maxsize=None)
 def _get_data(fn):
     """Inputs are sourced from the rcluster installation directory
 
@@ -48,6 +51,6 @@ def _get_data(fn):
     return os.path.join(_ROOT, 'data', fn)
 
 
-from .rcluster import RCluster
-from .pmkutils import pmk_connect, pmk_cmd, cpu_count, pmk_walk, pmk_put, \
-    pmk_get
+from .rcluster import RCluster, ConfigMissingError
+from .pmkutils import pmk_connect, pmk_connect_many, pmk_cmd, cpu_count, \
+    pmk_walk, pmk_put, pmk_put_tar, pmk_get
@@ -0,0 +1,4 @@
+"""Package name and version, kept free of imports so setup.py can read it."""
+
+__title__ = 'rcluster'
+__ver__ = '0.2.27'
@@ -6,12 +6,29 @@ AWS servers using :py:class:`paramiko.client.SSHClient` and
 
 import os
 import stat
+import posixpath
+import codecs
+import shlex
+import socket
+import tarfile
+import random
 import paramiko
 from time import sleep
-from queue import Queue
+from functools import lru_cache, partial
+from itertools import repeat
+from queue import Queue, Empty
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
 
+_HOST_KEY_POLICY = paramiko.client.AutoAddPolicy()
+
+# SFTP channel flow-control window; paramiko's 2 MB default stalls bulk
+# transfers on high bandwidth-delay links
+_SFTP_WINDOW_SIZE = 32 * 1024 * 1024
+
+# Bytes read per call when draining remote command output
+_RECV_SIZE = 65536
 
 def _unix_path(*args):
     """Most handle UNIX pathing, not vice versa, enforce standard
@@ -24,104 +41,220 @@ def _unix_path(*args):
     return os.path.join(*args).replace('\\', '/')
 
 
-def _walk_files(gen):
+@lru_cache(maxsize=8)
+def _load_key(key_path, mtime):
+    """
+    Parse a private key file once per path and modification time.
+
+    :param key_path: The location of the key pair file
+    :param mtime: The key file's modification time, so changed keys are reread
+    :return: :py:class:`paramiko.RSAKey` object
     """
-    Take a generator yielding root, dirs, files (as from os.walk()) and return a
-    list of all files.
+    return paramiko.RSAKey.from_private_key_file(key_path)
+
+
+def _walk_files(gen, top):
+    """
+    Take a generator yielding root, dirs, files (as from os.walk()) over the
+    tree at top and lazily yield all files, with each file's path relative to
+    top (computed by stripping the known prefix rather than os.path.relpath).
 
     :param gen: Generator yielding root, dirs, files (as from os.walk())
     :type gen: generator
-    :return: Fully qualified file paths
-    :rtype: list of strings
+    :param top: The directory walked by gen
+    :type top: string
+    :return: Fully qualified and relative file paths
+    :rtype: generator of tuples of strings
     """
-    all_files = []
+    base_len = len(_unix_path(top, ''))
     for root, dirs, files in gen:
+        # Normalize each directory once; file names carry no separators
+        root = _unix_path(root, '')
+        rel_root = root[base_len:]
         for fn in files:
-            all_files.append(_unix_path(root, fn))
-    return all_files
+            yield root + fn, rel_root + fn
+
+
+def _remote_attrs(sftp_conn, dirs):
+    """
+    Map remote file paths to their attributes, listing each directory once.
+    Directories that do not exist are skipped.
+
+    :param sftp_conn: :py:class:`paramiko.sftp_client.SFTPClient` object
+    :param dirs: Remote directories to list
+    :return: dict of remote path to :py:class:`paramiko.SFTPAttributes`
+    """
+    attrs = {}
+    for remote_dir in dirs:
+        try:
+            for f in sftp_conn.listdir_attr(remote_dir):
+                attrs[posixpath.join(remote_dir, f.filename)] = f
+        except IOError:
+            pass
+    return attrs
+
+
+def _is_current(source_attr, target_attr):
+    """
+    Whether a target file is an up-to-date copy of its source: same size and
+    same modification time. Transfers stamp the source's mtime on the target,
+    so the comparison never mixes the two hosts' clocks.
+
+    :param source_attr: :py:func:`os.stat` result or SFTP attributes, or None
+    :param target_attr: :py:func:`os.stat` result or SFTP attributes, or None
+    :rtype: bool
+    """
+    return (source_attr is not None and target_attr is not None and
+            source_attr.st_size == target_attr.st_size and
+            int(target_attr.st_mtime) == int(source_attr.st_mtime))
+
+
+def _backoff(attempt, base, cap):
+    """
+    Pause before retry number attempt + 1: exponential from base, capped, with
+    +/-20% jitter so parallel retries do not run in lockstep.
+
+    :param attempt: The zero-based number of the failed attempt
+    :param base: The initial pause (in seconds)
+    :param cap: The maximum pause (in seconds) before jitter
+    :return: None
+    """
+    sleep(min(cap, base * 2 ** attempt) * random.uniform(0.8, 1.2))
 
 
-def _open_sftp(client):
+def _open_sftp(client, max_attempts=10, base=0.5, cap=5):
     """
-    Open and return. If connection denied due to too many active connections,
-    try again until successful.
+    Open and return, with a large flow-control window for bulk transfers. If
+    connection denied due to too many active connections, back off and try
+    again, up to max_attempts times.
 
     :param client: Connected :py:class:`paramiko.client.SSHClient` object
+    :param max_attempts: The number of attempts before giving up
+    :param base: The initial pause (in seconds) between attempts
+    :param cap: The maximum pause (in seconds) between attempts
     :return: A connected :py:class:`paramiko.sftp_client.SFTPClient`
     """
-    try:
-        return client.open_sftp()
-    except paramiko.ssh_exception.ChannelException as e:
-        if 'Administratively prohibited' in str(e):
-            sleep(1)
-            return _open_sftp(client)
-        else:
-            raise e
+    for attempt in range(max_attempts):
+        try:
+            return paramiko.SFTPClient.from_transport(
+                client.get_transport(), window_size=_SFTP_WINDOW_SIZE
+            )
+        except paramiko.ssh_exception.ChannelException as e:
+            if ('Administratively prohibited' not in str(e) or
+                    attempt + 1 == max_attempts):
+                raise e
+            _backoff(attempt, base, cap)
 
 
-def _pmk_mover(func, client, file_tuples, threaded, thread_cap):
+def _top_up(client, sftp_pool, size, minimum=1):
     """
+    Open SFTP sessions into sftp_pool (in place) until it holds size sessions.
+    Sessions beyond minimum are opened with a single attempt, and the first
+    refusal (e.g. sshd's MaxSessions reached) ends the top-up rather than
+    failing the transfer.
 
-    :param func: :py:class:`paramiko.sftp_client.SFTPClient.put`
-    :param client:
-    :param file_tuples:
-    :param threaded:
+    :param client: Connected :py:class:`paramiko.client.SSHClient` object
+    :param sftp_pool: list of open :py:class:`paramiko.sftp_client.SFTPClient`
+        objects, extended in place
+    :param size: The number of sessions wanted
+    :param minimum: The number of sessions that must open (with retries)
+    :return: Whether the pool reached size
+    :rtype: bool
+    """
+    while len(sftp_pool) < size:
+        required = len(sftp_pool) < minimum
+        try:
+            sftp_pool.append(_open_sftp(client) if required
+                             else _open_sftp(client, max_attempts=1))
+        except paramiko.ssh_exception.ChannelException as err:
+            if required:
+                raise err
+            getLogger(__name__).debug('Server refused SFTP session %d: %s',
+                                      len(sftp_pool) + 1, err)
+            return False
+    return True
+
+
+def _pmk_mover(func, client, file_tuples, threaded, thread_cap, sftp_pool=()):
+    """
+    Transfer files with func, sharing a queue between up to thread_cap workers.
+    Each worker is handed its own SFTP session from a pool (topped up from
+    sessions the caller already opened, with fewer workers if the server
+    refuses more sessions); every session in the pool is closed once the
+    queue is drained.
+
+    :param func: :py:func:`_pmk_put` or :py:func:`_pmk_get`
+    :param client: Connected :py:class:`paramiko.client.SSHClient` object
+    :param file_tuples: list of (source, target) file path tuples
+    :param threaded: Whether to run transfers in parallel
+    :param thread_cap: The maximum number of parallel transfers
+    :param sftp_pool: Open :py:class:`paramiko.sftp_client.SFTPClient` objects
+        to reuse; closed by this function
     :return: None
     """
     file_queue = Queue()
     for tup in file_tuples:
         file_queue.put(tup)
-    if threaded:
-        jobs = []
-        for job in range(min(len(file_tuples), thread_cap)):
-            job = Thread(target=func,
-                         kwargs={"client": client, "file_queue": file_queue})
-            job.start()
-            jobs.append(job)
-        for job in jobs:
-            while job.is_alive():
-                sleep(1)
-    else:
-        func(client, file_queue)
-
-
-def _pmk_put(client, file_queue):
+    n_jobs = min(len(file_tuples), thread_cap if threaded else 1)
+    sftp_pool = list(sftp_pool)
+    try:
+        _top_up(client, sftp_pool, n_jobs)
+        n_jobs = min(n_jobs, len(sftp_pool))
+        if threaded:
+            with ThreadPoolExecutor(max_workers=max(n_jobs, 1)) as executor:
+                list(executor.map(func, sftp_pool[:n_jobs],
+                                  repeat(file_queue)))
+        elif n_jobs:
+            func(sftp_pool[0], file_queue)
+    finally:
+        for sftp_conn in sftp_pool:
+            sftp_conn.close()
+
+
+def _pmk_put(sftp_conn, file_queue):
     """
+    Send queued (source, target) files until the queue is empty, copying each
+    source's access and modification times onto its target.
 
-    :param client:
-    :param file_queue:
-    :return:
+    :param sftp_conn: :py:class:`paramiko.sftp_client.SFTPClient` object
+    :param file_queue: :py:class:`queue.Queue` of (source, target) tuples
+    :return: None
     """
     log = getLogger(__name__)
-    sftp_conn = _open_sftp(client)
-    while not file_queue.empty():
-        source_fn, target_fn = file_queue.get()
+    while True:
         try:
-            sftp_conn.mkdir(os.path.dirname(target_fn))
-        except OSError:
-            pass
+            source_fn, target_fn = file_queue.get_nowait()
+        except Empty:
+            return
         log.debug("Sending %s to %s", source_fn, target_fn)
+        source_attr = os.stat(source_fn)
         sftp_conn.put(source_fn, target_fn)
+        sftp_conn.utime(target_fn, (source_attr.st_atime,
+                                    source_attr.st_mtime))
         file_queue.task_done()
-    sftp_conn.close()
 
 
-def _pmk_get(client, file_queue):
+def _pmk_get(sftp_conn, file_queue, **kwargs):
     """
+    Retrieve queued (source, target) files until the queue is empty, copying
+    each source's access and modification times onto its target.
 
-    :param client:
-    :param file_queue:
-    :return:
+    :param sftp_conn: :py:class:`paramiko.sftp_client.SFTPClient` object
+    :param file_queue: :py:class:`queue.Queue` of (source, target) tuples
+    :param kwargs: Additional keyword parameters to SFTPClient.get()
+    :return: None
     """
     log = getLogger(__name__)
-    sftp_conn = _open_sftp(client)
-    while not file_queue.empty():
-        source_fn, target_fn = file_queue.get()
-        os.makedirs(os.path.dirname(target_fn), exist_ok=True)
+    while True:
+        try:
+            source_fn, target_fn = file_queue.get_nowait()
+        except Empty:
+            return
         log.debug("Sending %s to %s", source_fn, target_fn)
-        sftp_conn.get(source_fn, target_fn)
+        source_attr = sftp_conn.stat(source_fn)
+        sftp_conn.get(source_fn, target_fn, **kwargs)
+        os.utime(target_fn, (source_attr.st_atime, source_attr.st_mtime))
         file_queue.task_done()
-    sftp_conn.close()
 
 
 def _pmk_keepalive(client, interval):
@@ -146,101 +279,195 @@ def _pmk_keepalive(client, interval):
 
 
 def pmk_connect(host, key_path, username='ubuntu', keepalive=False,
-                interval=30):
+                interval=30, pkey=None, max_attempts=20, base=1, cap=10,
+                timeout=10):
     """
-    Create SSH connection to host, retrying on failure.
+    Create SSH connection to host, retrying on failure with exponential backoff.
+    Doubles as the readiness check for freshly launched instances, whose SSH
+    daemon may not yet accept connections.
 
     :param host: The address of the remote server
     :param key_path: The location of the key pair file
     :param username: The username to access on the remote server
     :param keepalive:
     :param interval:
+    :param pkey: A preloaded :py:class:`paramiko.RSAKey`; read (and cached)
+        from key_path when not provided
+    :param max_attempts: The number of connection attempts before giving up
+    :param base: The initial pause (in seconds) between attempts, doubled after
+        each failure
+    :param cap: The maximum pause (in seconds) between attempts
+    :param timeout: The TCP connect timeout (in seconds) for each attempt
     :return: Connected :py:class:`paramiko.client.SSHClient` class object
     """
     log = getLogger(__name__)
     log.debug('Connecting to %s@%s using key %s', username, host, key_path)
+    if not pkey:
+        pkey = _load_key(key_path, os.path.getmtime(key_path))
     client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.client.AutoAddPolicy())
-    try:
-        log.debug('Connecting to host %s', host)
-        k = paramiko.RSAKey.from_private_key_file(key_path)
-        client.connect(hostname=host, username=username, pkey=k)
-        if keepalive:
-            _pmk_keepalive(client, interval)
-        return client
-    except (TimeoutError, ConnectionRefusedError,
-            paramiko.ssh_exception.NoValidConnectionsError) as err:
-        log.debug('OS error: %s', err)
-        sleep(15)
-        return pmk_connect(host, key_path, username)
-    except Exception as err:
-        log.error('Connection failed, unexpected error:', err)
-        raise err
-
-
-def pmk_cmd(client, call, **kwargs):
+    client.set_missing_host_key_policy(_HOST_KEY_POLICY)
+    for attempt in range(max_attempts):
+        try:
+            log.debug('Connecting to host %s', host)
+            client.connect(hostname=host, username=username, pkey=pkey,
+                           timeout=timeout)
+            if keepalive:
+                _pmk_keepalive(client, interval)
+            return client
+        except paramiko.ssh_exception.AuthenticationException as err:
+            log.error('Authentication to %s failed: %s', host, err)
+            client.close()
+            raise err
+        # socket.timeout is only an alias of TimeoutError from Python 3.10
+        except (TimeoutError, socket.timeout, ConnectionRefusedError,
+                paramiko.ssh_exception.NoValidConnectionsError,
+                paramiko.ssh_exception.SSHException) as err:
+            log.debug('Attempt %d of %d failed: %s', attempt + 1, max_attempts,
+                      err)
+            # Drop any transport and socket the failed attempt left behind
+            client.close()
+            if attempt + 1 == max_attempts:
+                raise err
+            _backoff(attempt, base, cap)
+        except Exception as err:
+            log.error('Connection failed, unexpected error: %s', err)
+            client.close()
+            raise err
+
+
+def pmk_connect_many(hosts, key_path, thread_cap=32, **kwargs):
+    """
+    Create SSH connections to several hosts in parallel. If any connection
+    fails, the others are closed and the first error is raised.
+
+    :param hosts: list of remote server addresses
+    :param key_path: The location of the key pair file
+    :param thread_cap: The maximum number of simultaneous connection attempts
+    :param kwargs: Additional keyword parameters to :py:func:`pmk_connect`
+    :return: list of connected :py:class:`paramiko.client.SSHClient` objects,
+        in the order of hosts
+    """
+    if not hosts:
+        return []
+    connect = partial(pmk_connect, key_path=key_path, **kwargs)
+    with ThreadPoolExecutor(max_workers=min(len(hosts), thread_cap)) as ex:
+        futures = [ex.submit(connect, host) for host in hosts]
+    clients = []
+    error = None
+    for future in futures:
+        try:
+            clients.append(future.result())
+        except Exception as err:
+            error = error or err
+    if error:
+        for client in clients:
+            client.close()
+        raise error
+    return clients
+
+
+def pmk_cmd(client, call, stdin_data=None, capture=True, **kwargs):
     """Issue command over SSH, treat execution failure as program failure.
+    Each call opens a new channel on the client's already authenticated
+    transport, so reusing one client for many commands (including from several
+    threads) avoids repeated key exchanges.
 
     :param client: :py:class:`paramiko.client.SSHClient` class object
     :param call: String of shell command to be executed
+    :param stdin_data: Optional string or bytes written to the command's stdin
+        (which is then closed)
+    :param capture: Whether to keep stdout for the return value; output is
+        logged as it arrives either way
     :param kwargs: Additional keyword parameters to exec_command()
-    :return: Values returned to stdout
-    :rtype: list of strings
+    :return: Text returned to stdout (empty if not captured)
+    :rtype: string
     """
     log = getLogger(__name__)
     log.debug('Issuing "%s"', call)
     stdin, stdout, stderr = client.exec_command(call, **kwargs)
-    lines = []
-    for line in iter(lambda: stdout.readline(2048), ""):
-        log.debug(line.encode('utf-8'))
-        lines += line
+    if stdin_data is not None:
+        stdin.write(stdin_data)
+        stdin.channel.shutdown_write()
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    chunks = []
+    for data in iter(lambda: stdout.channel.recv(_RECV_SIZE), b''):
+        text = decoder.decode(data)
+        log.debug(text.encode('utf-8'))
+        if capture:
+            chunks.append(text)
+    chunks.append(decoder.decode(b'', final=True))
     exit_status = stdout.channel.recv_exit_status()
     if exit_status:
         text = ''.join(stderr.readlines()).encode('utf-8')
         log.error(text)
         raise Exception(text)
-    return lines
+    return ''.join(chunks) if capture else ''
 
 
 def cpu_count(client):
     """
     Given a :py:class:`paramiko.client.SSHClient` object, return the remote's
-    CPU count.
+    CPU count. The count is cached on the client after the first query.
 
     :param client: :py:class:`paramiko.client.SSHClient` class object
     :return: The number of physical CPUs on the remote instance
     :rtype: integer
     """
-    cpus = pmk_cmd(client, r'cat /proc/cpuinfo | grep processor | wc -l')
-    cpus = int(''.join([char for char in cpus if not char == r"\n"]))
+    cpus = getattr(client, '_cpu_count', None)
+    if cpus is None:
+        cpus = int(pmk_cmd(client, 'nproc --all').strip())
+        client._cpu_count = cpus
     return cpus
 
 
-def pmk_walk(sftp_conn, root):
-    """paramiko os.walk() equivalent.
+def pmk_walk(sftp_conn, root, sftp_pool=(), grow=None):
+    """paramiko os.walk() equivalent. Directories are listed breadth first;
+    when additional SFTP sessions are provided, the directories of each level
+    are split between the sessions and listed in parallel.
 
     :param sftp_conn: :py:class:`paramiko.sftp_client.SFTPClient` object
     :param root: Remote directory targeted
+    :param sftp_pool: Additional :py:class:`paramiko.sftp_client.SFTPClient`
+        objects (on the same server) to list directories in parallel
+    :param grow: Optional callable taking the number of sessions a level could
+        use beyond those held and returning a list of additional sessions;
+        called only for levels with more directories than sessions
     :return: A generator of root, dirs, files
     :rtype: generator
     """
-    files = []
-    dirs = []
-    for f in sftp_conn.listdir_attr(root):
-        if stat.S_ISDIR(f.st_mode):
-            dirs.append(f.filename)
-        else:
-            files.append(f.filename)
-    yield root, dirs, files
-    for folder in dirs:
-        for x in pmk_walk(sftp_conn, _unix_path(root, folder)):
-            yield x
-
-
-def pmk_put(client, sources, target, threaded=True, thread_cap=10):
+    conns = [sftp_conn] + list(sftp_pool)
+
+    def list_dirs(conn, folders):
+        return [(folder, conn.listdir_attr(folder)) for folder in folders]
+
+    level = [root]
+    while level:
+        if grow and len(level) > len(conns):
+            conns.extend(grow(len(level) - len(conns)))
+        n_conns = min(len(conns), len(level))
+        batches = [level[i::n_conns] for i in range(n_conns)]
+        level = []
+        with ThreadPoolExecutor(max_workers=n_conns) as executor:
+            for listings in executor.map(list_dirs, conns, batches):
+                for folder, attrs in listings:
+                    files = []
+                    dirs = []
+                    for f in attrs:
+                        if stat.S_ISDIR(f.st_mode):
+                            dirs.append(f.filename)
+                        else:
+                            files.append(f.filename)
+                    yield folder, dirs, files
+                    level.extend(posixpath.join(folder, d) for d in dirs)
+
+
+def pmk_put(client, sources, target, threaded=True, thread_cap=10,
+            force=False):
     """
     Copy local files to remote target. Directories are copied recursively when
-    provided as the source. Will do nothing if source does not exist.
+    provided as the source. Will do nothing if source does not exist. Files
+    whose remote copy has the same size and modification time are skipped
+    unless force is set.
 
     :param client: :py:class:`paramiko.client.SSHClient` object
     :param sources: The local data source
@@ -248,6 +475,7 @@ def pmk_put(client, sources, target, threaded=True, thread_cap=10):
     :param threaded:
     :param thread_cap: The maximum numbers of SFTP transfers to attempt; default
         is 10 (as SSH's `MaxSessions` default)
+    :param force: Whether to transfer files even if the target is up to date
     :return: None
     """
     send_files = []
@@ -258,18 +486,67 @@ def pmk_put(client, sources, target, threaded=True, thread_cap=10):
             target_fn = _unix_path(target, os.path.basename(source))
             send_files.append((source, target_fn))
         if os.path.isdir(source):
-            for source_fn in _walk_files(os.walk(source)):
-                target_fn = _unix_path(target,
-                                       os.path.relpath(source_fn, source))
-                send_files.append((source_fn, target_fn))
-    _pmk_mover(_pmk_put, client=client, file_tuples=send_files,
-               threaded=threaded, thread_cap=thread_cap)
+            for source_fn, rel_fn in _walk_files(os.walk(source), source):
+                send_files.append((source_fn, _unix_path(target, rel_fn)))
+    dirs = {os.path.dirname(target_fn) for _, target_fn in send_files} - {''}
+    sftp_pool = []
+    try:
+        if dirs and not force:
+            sftp_pool.append(_open_sftp(client))
+            attrs = _remote_attrs(sftp_pool[0], dirs)
+            send_files = [(source_fn, target_fn)
+                          for source_fn, target_fn in send_files
+                          if not _is_current(os.stat(source_fn),
+                                             attrs.get(target_fn))]
+            dirs = {os.path.dirname(target_fn) for _, target_fn in send_files}
+        if dirs:
+            pmk_cmd(client,
+                    'mkdir -p ' + ' '.join(shlex.quote(d) for d in dirs))
+        _pmk_mover(_pmk_put, client=client, file_tuples=send_files,
+                   threaded=threaded, thread_cap=thread_cap,
+                   sftp_pool=sftp_pool)
+    finally:
+        # _pmk_mover closes the pool itself; this covers earlier failures
+        for sftp_conn in sftp_pool:
+            sftp_conn.close()
+
+
+def pmk_put_tar(client, source, target):
+    """
+    Copy a local directory to a remote target as one gzipped tar stream over a
+    single SSH channel, avoiding per-file SFTP round-trips for trees of many
+    small files. Requires ``tar`` on the remote server. The directory's
+    children are archived individually, with no ``.`` entry, so extraction
+    never tries to chmod or utime a target directory owned by another user.
+
+    :param client: :py:class:`paramiko.client.SSHClient` object
+    :param source: The local directory
+    :param target: The remote data destination (created if missing)
+    :return: None
+    """
+    log = getLogger(__name__)
+    call = 'mkdir -p {0} && tar xzf - -C {0}'.format(shlex.quote(target))
+    log.debug('Streaming %s to %s', source, target)
+    stdin, stdout, stderr = client.exec_command(call)
+    with tarfile.open(fileobj=stdin, mode='w|gz') as tar:
+        for name in sorted(os.listdir(source)):
+            tar.add(os.path.join(source, name), arcname=name)
+    stdin.flush()
+    stdin.channel.shutdown_write()
+    exit_status = stdout.channel.recv_exit_status()
+    if exit_status:
+        text = ''.join(stderr.readlines()).encode('utf-8')
+        log.error(text)
+        raise Exception(text)
 
 
-def pmk_get(client, sources, target, threaded=True, thread_cap=10):
+def pmk_get(client, sources, target, threaded=True, thread_cap=10,
+            force=False, prefetch=True, max_concurrent_prefetch_requests=64):
     """
-    Copy local files to remote target. Directories are copied recursively when
-    provided as the source. Will do nothing if source does not exist.
+    Copy remote files to local target. Directories are copied recursively when
+    provided as the source. Will do nothing if source does not exist. Files
+    whose local copy has the same size and modification time are skipped
+    unless force is set.
 
     :param client: :py:class:`paramiko.client.SSHClient` object
     :param sources: The local data source
@@ -277,24 +554,64 @@ def pmk_get(client, sources, target, threaded=True, thread_cap=10):
     :param threaded:
     :param thread_cap: The maximum numbers of SFTP transfers to attempt; default
         is 10 (as SSH's `MaxSessions` default)
+    :param force: Whether to transfer files even if the target is up to date
+    :param prefetch: Whether to pipeline read requests for each file
+    :param max_concurrent_prefetch_requests: The maximum outstanding read
+        requests per file (per transfer thread); default is 64, as OpenSSH
     :return: None
     """
-    sftp_conn = client.open_sftp()
+    sftp_conn = _open_sftp(client)
+    walk_pool = []
+    walk_cap = thread_cap - 1
     get_files = []
+
+    def grow(wanted):
+        # Extra listing sessions are opened only once a level fans out, and
+        # no more are tried after the server refuses one
+        nonlocal walk_cap
+        start = len(walk_pool)
+        if not _top_up(client, walk_pool, min(start + wanted, walk_cap),
+                       minimum=0):
+            walk_cap = len(walk_pool)
+        return walk_pool[start:]
+
     if not type(sources) is list:
         sources = [sources]
-    for source in sources:
-        try:
-            stat_mode = sftp_conn.lstat(source).st_mode
-            if stat.S_ISREG(stat_mode):
-                get_files.append((source, target))
-            if stat.S_ISDIR(stat_mode):
-                for source_fn in _walk_files(pmk_walk(sftp_conn, source)):
-                    target_fn = os.path.join(target,
-                                             os.path.relpath(source_fn, source))
-                    get_files.append((source_fn, target_fn))
-        except IOError as e:
-            if not 'No such file' in str(e):
-                raise e
-    _pmk_mover(_pmk_get, client=client, file_tuples=get_files,
-               threaded=threaded, thread_cap=thread_cap)
+    try:
+        for source in sources:
+            try:
+                stat_mode = sftp_conn.lstat(source).st_mode
+                if stat.S_ISREG(stat_mode):
+                    get_files.append((source, target))
+                if stat.S_ISDIR(stat_mode):
+                    walk = pmk_walk(sftp_conn, source, walk_pool,
+                                    grow if threaded else None)
+                    for source_fn, rel_fn in _walk_files(walk, source):
+                        get_files.append((source_fn,
+                                          os.path.join(target, rel_fn)))
+            except IOError as e:
+                if not 'No such file' in str(e):
+                    raise e
+        if not force:
+            existing = [(source_fn, target_fn)
+                        for source_fn, target_fn in get_files
+                        if os.path.isfile(target_fn)]
+            attrs = _remote_attrs(sftp_conn, {os.path.dirname(source_fn)
+                                              for source_fn, _ in existing})
+            current = {source_fn for source_fn, target_fn in existing
+                       if _is_current(attrs.get(source_fn),
+                                      os.stat(target_fn))}
+            get_files = [tup for tup in get_files if tup[0] not in current]
+        for target_dir in {os.path.dirname(fn) for _, fn in get_files} - {''}:
+            os.makedirs(target_dir, exist_ok=True)
+        get_file = partial(
+            _pmk_get, prefetch=prefetch,
+            max_concurrent_prefetch_requests=max_concurrent_prefetch_requests
+        )
+        _pmk_mover(get_file, client=client, file_tuples=get_files,
+                   threaded=threaded, thread_cap=thread_cap,
+                   sftp_pool=[sftp_conn] + walk_pool)
+    finally:
+        # _pmk_mover closes the pool itself; this covers earlier failures
+        for conn in [sftp_conn] + walk_pool:
+            conn.close()
@@ -1,13 +1,27 @@
 import os
 import json
-from time import sleep
 from inspect import signature
 from pprint import PrettyPrinter
-from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
 from boto3 import session
+from botocore.exceptions import ClientError
 
 import rcluster as rcl
+from rcluster.pmkutils import _backoff
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ConfigMissingError(ValueError):
+    """Raised when a configuration file lacks mandatory values."""
+
+    def __init__(self, keys):
+        self.keys = keys
+        super().__init__('Missing configuration values: ' + ', '.join(keys))
 
 
 class RCluster:
@@ -27,7 +41,7 @@ class RCluster:
     def __init__(self, aws_access_key_id, aws_secret_access_key, region_name,
                  instance_conf, manager_runtime=None, worker_runtime=None,
                  key_path=None, ip_ref='public_ip_address', ver=rcl.__ver__,
-                 purge=False):
+                 launch_template_id=None, purge=False):
         """Initialize the RCluster object.
         
         :param aws_access_key_id: AWS access key provided to
@@ -49,13 +63,17 @@ class RCluster:
         :param ip_ref: Whether to provide the user with the public IP or private
             IP (useful when configured behind a VPC)
         :param ver: Designated to stamp Security Groups, Placement Groups, keys,
-            and all instances launched
+            launch templates, and all instances launched
+        :param launch_template_id: ID of an EC2 launch template holding the
+            instance configuration (see
+            :meth:`~.rcluster.RCluster.create_launch_template`)
         :param purge: Whether to purge previous objects registered to the
             provided version stamp.
         """
-        self._kwargs = list(signature(RCluster).parameters.keys())
-        self._kwargs.remove('purge')
         self._config = {}
+        self._clients = {}
+        self._template_data = None
+        self._template_version = None
         self._log = getLogger(__name__)
         self.ses = session.Session(
             aws_access_key_id=aws_access_key_id,
@@ -81,20 +99,23 @@ class RCluster:
                 Description='22 and 8787 open, permissive internal traffic.'
             )
             instance_conf['SecurityGroups'] = [ver]
-            sleep(1)  # Security group may not "exist" in time for next call
-            sg.authorize_ingress(IpProtocol='tcp', FromPort=22, ToPort=22,
-                                 CidrIp='0.0.0.0/0')
-            sg.authorize_ingress(IpProtocol='tcp', FromPort=8787, ToPort=8787,
-                                 CidrIp='0.0.0.0/0')
-            sg.authorize_ingress(SourceSecurityGroupName=ver)
+            _authorize_ingress(self.ec2.meta.client, sg.id, [
+                {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22,
+                 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
+                {'IpProtocol': 'tcp', 'FromPort': 8787, 'ToPort': 8787,
+                 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
+                {'IpProtocol': '-1', 'UserIdGroupPairs': [{'GroupId': sg.id}]}
+            ])
 
         if 'Placement' not in instance_conf:
             pg = self.ec2.create_placement_group(GroupName=ver,
                                                  Strategy='cluster')
             instance_conf['Placement'] = {'GroupName': ver}
 
-        for key in self._kwargs:
-            self.__setattr__(key, locals()[key])
+        params = locals()
+        config = {key: params[key] for key in self._KWARGS}
+        self._config.update(config)
+        self.__dict__.update(config)
 
     def __repr__(self):
         """Indicates RCluster and pretty prints the _config dictionary"""
@@ -110,7 +131,7 @@ class RCluster:
         See :meth:`~.rcluster.RCluster.fromConfig` and
         :meth:`~.rcluster.RCluster.writeConfig`
         """
-        if '_config' in self.__dict__ and key in self._kwargs:
+        if '_config' in self.__dict__ and key in self._KWARGS:
             self._log.debug('Setting configuration attribute %s', key)
             self._config[key] = value
         super().__setattr__(key, value)
@@ -120,65 +141,99 @@ class RCluster:
 
         :param fn: The filename to be written, will overwrite previous file
         """
-        with open(fn, 'w') as out:
-            json.dump(self._config, out, indent=2, sort_keys=True)
+        with open(fn, 'w', encoding='utf-8') as out:
+            out.write(_json_dumps(self._config))
+
+    def snapshot(self):
+        """
+        Return an independent copy of the RCluster configuration dictionary,
+        round-tripped through a fresh JSON serialization rather than
+        deep-copied.
+        """
+        return _json_loads(_json_dumps(self._config))
 
-    def from_config(fn, **kwargs):
+    @classmethod
+    def from_config(cls, fn, interactive=True, **kwargs):
         """
         Use RCluster JSON configuration to create RCluster object.
-        Prompts the user to input mandatory configuration values that are
-        missing (i.e., AWS access credentials).
+        Prompts the user to input mandatory configuration values (those
+        without defaults, i.e., AWS access credentials) that are missing;
+        optional values saved as null are left unset.
 
         :param fn: The filename containing RCluster configuration data
+        :param interactive: Whether to prompt for missing configuration values;
+            if False, :class:`ConfigMissingError` is raised instead
         :param kwargs: Alternate or supplement RCluster configuration; will
             override the content of fn
         :returns: An :py:class:`~RCluster` object
         """
-        with open(fn, 'r') as out:
-            dic = json.load(out)
+        with open(fn, 'rb') as out:
+            dic = _json_loads(out.read())
         dic.update(kwargs)
-        for key in sorted(dic):
-            if dic[key] is None:
-                dic[key] = input(key + ': ')
-        return RCluster(**dic)
-
-    def create_instances(self, n_instances, **kwargs):
+        missing = [key for key in cls._REQUIRED if dic.get(key) is None]
+        if missing and not interactive:
+            raise ConfigMissingError(missing)
+        for key in missing:
+            dic[key] = input(key + ': ')
+        return cls(**dic)
+
+    def create_instances(self, n_instances, client_token=None, **kwargs):
         """Create EC2 instances using RCluster's configuration.
 
         :param n_instances: The number of instances to be created
+        :param client_token: Idempotency token for the launch request; repeating
+            a launch with the same token (within 24 hours) returns the
+            instances from the first request rather than launching new ones
         :param kwargs: arbitrary arguments to boto3 Session Resource
             ec2.create_instances; will supersede RCluster.instance_conf content
         :returns: list; each object is a boto3.EC2.Instance object
         """
         self._log.debug('Creating %d instances.', n_instances)
-        conf = self.instance_conf.copy()
-        conf.update(kwargs)
-        conf = {key: value for key, value in conf.items() if value}
+        # A None override removes an instance_conf setting, which a launch
+        # from the template cannot express
+        if self.launch_template_id and None not in kwargs.values():
+            conf = {key: value for key, value in kwargs.items() if value}
+            conf['LaunchTemplate'] = {
+                'LaunchTemplateId': self.launch_template_id,
+                'Version': self._sync_launch_template()
+            }
+        else:
+            conf = self.instance_conf.copy()
+            conf.update(kwargs)
+            conf = {key: value for key, value in conf.items() if value}
+            conf['KeyName'] = self.key_name
+        if client_token:
+            self._log.debug('Launching with client token %s', client_token)
+            conf['ClientToken'] = client_token
         instances = self.ec2.create_instances(
             DryRun=False,
             MinCount=n_instances,
             MaxCount=n_instances,
-            KeyName=self.key_name,
             **conf
         )
-        instances[0].wait_until_running()
-        sleep(5)
-        for instance in instances:
-            instance.create_tags(
-                DryRun=False,
-                Tags=[{'Key': 'rcluster', 'Value': self.ver}]
-            )
         ids = [instance.id for instance in instances]
+        self.ec2.meta.client.get_waiter('instance_running').wait(
+            InstanceIds=ids,
+            WaiterConfig={'Delay': 1, 'MaxAttempts': 300}
+        )
+        self.ec2.meta.client.create_tags(
+            DryRun=False,
+            Resources=ids,
+            Tags=[{'Key': 'rcluster', 'Value': self.ver}]
+        )
+        # One DescribeInstances call refreshes every instance's addresses, which
+        # are unassigned in the RunInstances response; reloading each instance
+        # would cost one call per instance instead.
         return list(self.ec2.instances.filter(InstanceIds=ids))
 
-    def create_cluster(self, n_workers=0, setup_pause=40, **kwargs):
+    def create_cluster(self, n_workers=0, client_token=None, **kwargs):
         """Initialize the cluster.
         Launch a manager instance and n_workers worker instances, automating the
         configuration of their shared networking.
 
         :param n_workers: Number of worker instances to launch (default 1)
-        :param setup_pause: Pause time to allow manager and workers to boot
-            before attempting configuration steps (default 60)
+        :param client_token: Idempotency token for the launch request (see
+            :meth:`~.rcluster.RCluster.create_instances`)
         :param kwargs: arbitrary arguments to boto3 Session Resource
             ec2.create_instances; will supersede RCluster.instance_conf content
         """
@@ -187,57 +242,109 @@ class RCluster:
                 self._log.debug('Active cluster found, returned.')
                 return self.rcluster
         self._log.debug('Creating cluster of %d workers.', n_workers)
-        instances = self.create_instances(n_workers + 1, **kwargs)
-        sleep(setup_pause)
+        instances = self.create_instances(n_workers + 1, client_token,
+                                          **kwargs)
         try:
             manager = instances[0]
             manager.create_tags(DryRun=False,
                                 Tags=[{'Key': self.ver, 'Value': 'manager'}])
             workers = instances[1:]
-            self.manager_private = getattr(manager, 'private_ip_address')
-            self.hostfile = ''
-            hostfile_lock = Lock()
-            worker_threads = []
-            for worker in workers:
-                worker_thread = Thread(target=self._configure_instance,
-                                       kwargs={
-                                           "instance": worker,
-                                           "runtime": self.worker_runtime,
-                                           "hostfile_lock": hostfile_lock
-                                       })
-                worker_thread.start()
-                worker_threads.append(worker_thread)
-            for worker_thread in worker_threads:
-                worker_thread.join()
-            self._configure_instance(manager, self.manager_runtime,
-                                     hostfile_lock)
+            self._connect_all(instances)
+            self.manager_private = manager.private_ip_address
+            self.access_ip = getattr(manager, self.ip_ref)
+            # The manager's runtime needs the complete hostfile, so it is
+            # issued after the others; its CPU count is gathered alongside
+            runtimes = [None] + [self.worker_runtime] * len(workers)
+            with ThreadPoolExecutor(max_workers=min(32, len(instances))) as ex:
+                hosts = list(ex.map(self._configure_instance, instances,
+                                    runtimes))
+            parts = []
+            for ip, cpus in hosts[1:] + hosts[:1]:
+                parts.extend([ip + '\n'] * cpus)
+            self.hostfile = ''.join(parts)
+            if self.manager_runtime:
+                rcl.pmk_cmd(self.connect(manager),
+                            self.manager_runtime.format(**self.__dict__))
         except Exception as err:
-            [instance.terminate() for instance in instances]
+            self._terminate(instances)
             self._log.error('Error during instance configuration: %s', err)
             raise err
+        finally:
+            self.close_all()
         self.rcluster = instances
         return self.rcluster
 
-    def _configure_instance(self, instance, runtime, hostfile_lock):
+    def _configure_instance(self, instance, runtime=None):
+        """
+        Connect to an instance, count its CPUs, and issue its runtime command.
+
+        :param instance: A boto3.EC2.Instance object
+        :param runtime: String containing shell runtime command for the instance
+        :return: tuple of the instance's private IP address and CPU count
+        """
         self._log.debug('Configuring instance %s', instance.instance_id)
         client = self.connect(instance)
-        cpus = rcl.cpu_count(client)
-        with hostfile_lock:
-            self.hostfile += (instance.private_ip_address + '\n') * cpus
+        # Loaded with the instance's description, and reflects any CpuOptions
+        # set at launch (unlike the instance type's default vCPU count)
+        options = instance.cpu_options or {}
+        cpus = options.get('CoreCount', 0) * options.get('ThreadsPerCore', 1)
         if runtime:
-            rcl.pmk_cmd(client, runtime.format(**self.__dict__))
+            runtime = runtime.format(**self.__dict__)
+            if not cpus:
+                # Count CPUs in the runtime's channel to save a round trip; the
+                # brace group keeps the runtime's own parsing (||, ;, trailing
+                # & or comment) and runs it only once nproc has printed
+                out = rcl.pmk_cmd(client,
+                                  'nproc --all && {\n' + runtime + '\n}')
+                cpus = int(out.split('\n', 1)[0])
+            else:
+                rcl.pmk_cmd(client, runtime)
+        elif not cpus:
+            cpus = rcl.cpu_count(client)
+        return instance.private_ip_address, cpus
 
     def connect(self, instance=None, **kwargs):
         """
         Create SSH connection to boto3.EC2.Instance as paramiko.client.
+        Connections are cached per instance and reused while their transport
+        remains active.
 
         :param instance: A boto3.EC2.Instance object
         """
         if not instance:
             instance = self.get_manager()
+        client = self._clients.get(instance.instance_id)
+        if client:
+            transport = client.get_transport()
+            if transport and transport.is_active():
+                return client
         host = getattr(instance, self.ip_ref)
         key_path = self.key_path
-        return rcl.pmk_connect(host, key_path, **kwargs)
+        client = rcl.pmk_connect(host, key_path, **kwargs)
+        self._clients[instance.instance_id] = client
+        return client
+
+    def _connect_all(self, instances):
+        """
+        Open SSH connections to all uncached instances in parallel, caching
+        them for :meth:`connect`.
+
+        :param instances: list of boto3.EC2.Instance objects
+        """
+        pending = [instance for instance in instances
+                   if instance.instance_id not in self._clients]
+        clients = rcl.pmk_connect_many(
+            [getattr(instance, self.ip_ref) for instance in pending],
+            self.key_path
+        )
+        for instance, client in zip(pending, clients):
+            self._clients[instance.instance_id] = client
+
+    def close_all(self):
+        """Close all cached SSH connections opened by :meth:`connect`."""
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
 
     def get_manager(self):
         """
@@ -271,7 +378,7 @@ class RCluster:
         """
         manager = self.get_manager()
         if manager:
-            return getattr(manager[0], self.ip_ref)
+            return getattr(manager, self.ip_ref)
 
     def get_instances(self, ver=None):
         if not ver:
@@ -293,10 +400,20 @@ class RCluster:
         """
         instances = self.get_instances(ver)
         if instances:
-            [instance.terminate() for instance in instances]
+            self._terminate(instances)
         else:
             self._log.debug("No instances terminated.")
 
+    def _terminate(self, instances):
+        """
+        Terminate instances with a single TerminateInstances request.
+
+        :param instances: list of boto3.EC2.Instance objects
+        """
+        ids = [instance.id for instance in instances]
+        self._log.debug('Terminating instances %s', ids)
+        self.ec2.meta.client.terminate_instances(InstanceIds=ids)
+
     def create_ami(self, base=None, setup_fn=None, ver=None, update_image=True,
                    terminate=True, wait=True):
         """
@@ -319,13 +436,17 @@ class RCluster:
                 InstanceType='m4.large',
                 Placement=None
             )[0]
-            sleep(20)
         if setup_fn:
             client = self.connect(base)
-            sftp_conn = client.open_sftp()
-            sftp_conn.put(setup_fn, 'setup.sh')
             self._log.debug('Setup script %s, running configuration.', setup_fn)
-            rcl.pmk_cmd(client, 'sudo bash setup.sh')
+            with open(setup_fn, 'rb') as script:
+                # Streamed to bash's stdin (no argument size limit); the brace
+                # group is parsed in full before running, so the script's
+                # commands read /dev/null rather than the rest of the script
+                rcl.pmk_cmd(client, 'sudo bash -s',
+                            stdin_data=b'{\n' + script.read() +
+                                       b'\n} < /dev/null\n',
+                            capture=False)
         if not ver:
             ver = self.ver
         self._log.debug('Creating AMI %s', self.ver)
@@ -337,44 +458,104 @@ class RCluster:
         )
         base.wait_until_running()
         if wait:
-            while 'available' not in self.ec2.Image(image.id).state:
-                self._log.debug('Waiting for AMI %s to be available', image.id)
-                sleep(20)
+            self._log.debug('Waiting for AMI %s to be available', image.id)
+            self.ec2.meta.client.get_waiter('image_available').wait(
+                ImageIds=[image.id]
+            )
         if terminate:
             base.terminate()
         if update_image:
-            self.instance_conf['ImageId'] = image.id
+            self.instance_conf = dict(self.instance_conf, ImageId=image.id)
         return image.id
 
-    def put_data(self, sources, target=None, client=None, threaded=True):
+    def create_launch_template(self):
+        """
+        Save instance_conf as an EC2 launch template named after self.ver (or
+        as a new version of the existing template) so instances are launched
+        from a stored configuration. Optional; requires the launch template
+        IAM permissions. Once created, the template is versioned again before
+        any launch for which instance_conf has changed.
+
+        :return: The launch template ID
+        """
+        data = self._launch_template_data()
+        client = self.ec2.meta.client
+        if self.launch_template_id:
+            self._log.debug('Versioning launch template %s',
+                            self.launch_template_id)
+            response = client.create_launch_template_version(
+                LaunchTemplateId=self.launch_template_id,
+                LaunchTemplateData=data
+            )
+            version = response['LaunchTemplateVersion']['VersionNumber']
+        else:
+            self._log.debug('Creating launch template %s', self.ver)
+            response = client.create_launch_template(
+                LaunchTemplateName=self.ver,
+                LaunchTemplateData=data
+            )
+            self.launch_template_id = \
+                response['LaunchTemplate']['LaunchTemplateId']
+            version = response['LaunchTemplate']['LatestVersionNumber']
+        self._template_data = data
+        self._template_version = str(version)
+        return self.launch_template_id
+
+    def _launch_template_data(self):
+        """
+        Return the launch template data matching instance_conf, copied through
+        a JSON round-trip (as :meth:`snapshot`) so later edits to
+        instance_conf cannot alter it.
+        """
+        conf = _json_loads(_json_dumps(self.instance_conf))
+        data = {key: value for key, value in conf.items() if value}
+        data['KeyName'] = self.key_name
+        return data
+
+    def _sync_launch_template(self):
+        """
+        Version the launch template if it was not created from the current
+        instance_conf (including edits in place or in the configuration file).
+
+        :return: The template version to launch
+        """
+        if self._launch_template_data() != self._template_data:
+            self.create_launch_template()
+        return self._template_version
+
+    def put_data(self, sources, target=None, client=None, threaded=True,
+                 force=False):
         """
 
         :param sources:
         :param target:
         :param client:
         :param threaded:
+        :param force:
         :return:
         """
         if not target:
             target = "/shared"
         if not client:
             client = self.connect()
-        rcl.pmk_put(client, sources, target, threaded=threaded)
+        rcl.pmk_put(client, sources, target, threaded=threaded, force=force)
 
-    def get_data(self, target, sources=None, client=None, threaded=True):
+    def get_data(self, target, sources=None, client=None, threaded=True,
+                 force=False):
         """
 
         :param target:
         :param sources:
         :param client:
         :param threaded:
+        :param force:
         :return:
         """
         if not sources:
             sources = "/shared"
         if not client:
             client = self.connect()
-        rcl.pmk_get(client, sources, target, threaded=threaded)
+        rcl.pmk_get(client, sources, target, threaded=threaded, force=force)
 
     def issue_cmd(self, call, client=None, **kwargs):
         """
@@ -388,6 +569,61 @@ class RCluster:
         return rcl.pmk_cmd(client, call, **kwargs)
 
 
+# Configuration attributes tracked by RCluster.__setattr__, computed once
+RCluster._KWARGS = tuple(key for key in signature(RCluster).parameters
+                         if key != 'purge')
+# Configuration values without defaults, prompted for by from_config
+RCluster._REQUIRED = tuple(
+    key for key, param in signature(RCluster).parameters.items()
+    if param.default is param.empty
+)
+
+
+def _json_dumps(obj):
+    """Serialize to indented, key-sorted JSON, using orjson when installed."""
+    if orjson:
+        return orjson.dumps(
+            obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        ).decode('utf-8')
+    return json.dumps(obj, indent=2, sort_keys=True)
+
+
+def _json_loads(data):
+    """Parse JSON bytes or text, using orjson when installed."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _authorize_ingress(client, group_id, permissions, max_attempts=8, base=0.25,
+                       cap=4):
+    """
+    Authorize all ingress rules on a security group in a single API call.
+    A freshly created group may not yet be visible to EC2 (eventual
+    consistency), so InvalidGroup.NotFound is retried with backoff.
+
+    :param client: A boto3 EC2.Client
+    :param group_id: The ID of the security group
+    :param permissions: List of IpPermissions dictionaries
+    :param max_attempts: The number of attempts before re-raising
+    :param base: The initial pause (in seconds) between attempts
+    :param cap: The maximum pause (in seconds) between attempts
+    :return: None
+    """
+    for attempt in range(max_attempts):
+        try:
+            client.authorize_security_group_ingress(GroupId=group_id,
+                                                    IpPermissions=permissions)
+            return
+        except ClientError as err:
+            code = err.response.get('Error', {}).get('Code')
+            if code != 'InvalidGroup.NotFound' or attempt + 1 == max_attempts:
+                raise
+            getLogger(__name__).debug('Security group %s not visible yet',
+                                      group_id)
+            _backoff(attempt, base, cap)
+
+
 def _ec2_purge(ec2_res, ver):
     """
     Utility to clear an AWS account of previous RCluster settings (useful for
@@ -398,12 +634,14 @@ def _ec2_purge(ec2_res, ver):
     * Deletes key-pair named `ver`
     * Deletes placement group named `ver`
     * Deletes security group named `ver`
+    * Deletes launch template named `ver`
 
     :param ec2_res: A boto3.EC2.ServiceResource
     :param ver: The "version" to delete
     """
     log = getLogger(__name__)
     log.info('Purging %s configurations', ver)
+    client = ec2_res.meta.client
     instances = ec2_res.instances.filter(
         DryRun=False,
         Filters=[
@@ -412,17 +650,40 @@ def _ec2_purge(ec2_res, ver):
             {'Name': 'instance-state-name',
              'Values': ['running', 'pending']}
         ])
-    [instance.terminate() for instance in instances]
+    instance_ids = [instance.id for instance in instances]
+    if instance_ids:
+        client.terminate_instances(InstanceIds=instance_ids)
     images = ec2_res.images.filter(
         DryRun=False,
         Filters=[{'Name': 'name', 'Values': [ver]}]
     )
-    [image.deregister() for image in images]
     key_pairs = ec2_res.key_pairs.filter(
         DryRun=False,
         Filters=[{'Name': 'key-name', 'Values': [ver]}]
     )
-    [key_pair.delete() for key_pair in key_pairs]
+    try:
+        templates = client.describe_launch_templates(
+            DryRun=False,
+            Filters=[{'Name': 'launch-template-name', 'Values': [ver]}]
+        )['LaunchTemplates']
+    except ClientError as err:
+        # Launch templates are optional; skip them without the permission
+        log.debug('Skipping launch templates: %s', err)
+        templates = []
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        jobs = [executor.submit(image.deregister) for image in images]
+        jobs += [executor.submit(key_pair.delete) for key_pair in key_pairs]
+        jobs += [executor.submit(client.delete_launch_template,
+                                 LaunchTemplateId=template['LaunchTemplateId'])
+                 for template in templates]
+        if instance_ids:
+            # Placement and security groups cannot be deleted while in use
+            jobs.append(executor.submit(
+                client.get_waiter('instance_terminated').wait,
+                InstanceIds=instance_ids
+            ))
+    for job in jobs:
+        job.result()
     placement_groups = ec2_res.placement_groups.filter(
         DryRun=False,
         Filters=[{'Name': 'group-name', 'Values': [ver]}]
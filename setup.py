@@ -2,19 +2,23 @@
 
 from setuptools import setup
 from os import path
-from pypandoc import convert
-
-from rcluster import __title__, __ver__
 
 here = path.abspath(path.dirname(__file__))
-long_description = convert(path.join(here, 'README.md'), 'rst')
-long_description = long_description.replace("\r\n", "\n")
+
+# Read the version without importing rcluster (and with it boto3/paramiko)
+about = {}
+with open(path.join(here, 'rcluster', '_version.py'), encoding='utf-8') as f:
+    exec(f.read(), about)
+
+with open(path.join(here, 'README.md'), encoding='utf-8') as f:
+    long_description = f.read()
 
 setup(
-    name=__title__,
-    version=__ver__,
+    name=about['__title__'],
+    version=about['__ver__'],
     description='R clusters on AWS',
     long_description=long_description,
+    long_description_content_type='text/markdown',
     url='https://github.com/ElizabethAB/rcluster',
     author='Elizabeth Byerly',
     author_email='elizabeth.byerly@gmail.com',
@@ -32,8 +36,9 @@ setup(
     ],
     keywords='r aws cluster cloud',
     packages=['rcluster'],
-    install_requires=['boto3', 'paramiko'],
-    extras_require={'dev': ['coverage', 'pytest', 'pypandoc']},
+    install_requires=['boto3', 'paramiko>=3.3'],
+    extras_require={'dev': ['coverage', 'pytest'],
+                    'json': ['orjson']},
     package_data={'rcluster': ['data/*']},
     entry_points={
         'console_scripts': [
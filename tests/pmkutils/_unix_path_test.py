@@ -2,22 +2,15 @@ import pytest
 
 from rcluster.pmkutils import _unix_path
 
-val = "hello/this/is.text"
+_MSG_PATH_NONE = r"expected str, bytes or os\.PathLike object, not NoneType"
 
 
-def test_valid():
-    assert _unix_path(val) == val
-
-
-def test_windows():
-    assert _unix_path("hello\\this\\is.text") == val
-
-
-def test_mix():
-    assert _unix_path("hello\\this/is.text") == val
+@pytest.mark.parametrize("idx", range(3), ids=["valid", "windows", "mix"])
+def test_normalize(unix_paths, idx):
+    val = unix_paths[0]
+    assert _unix_path(unix_paths[idx]) == val
 
 
 def test_none():
-    with pytest.raises(TypeError) as exc:
+    with pytest.raises(TypeError, match=_MSG_PATH_NONE):
         _unix_path(None)
-    assert "join() argument must be str or bytes" in str(exc.value)
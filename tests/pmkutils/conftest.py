@@ -0,0 +1,140 @@
+import io
+import os
+import shutil
+import subprocess
+
+import paramiko
+import pytest
+
+from rcluster import pmkutils
+
+
+@pytest.fixture(scope="session")
+def unix_paths():
+    return ("hello/this/is.text", "hello\\this\\is.text",
+            "hello\\this/is.text")
+
+
+class FakeChannel:
+    """Stands in for a paramiko Channel, replaying canned stdout reads."""
+
+    def __init__(self, chunks=(), exit_status=0):
+        self.chunks = list(chunks)
+        self.exit_status = exit_status
+        self.write_shut = False
+
+    def recv(self, size):
+        return self.chunks.pop(0)[:size] if self.chunks else b''
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def shutdown_write(self):
+        self.write_shut = True
+
+
+class FakeStdin(io.BytesIO):
+
+    def __init__(self, channel):
+        super().__init__()
+        self.channel = channel
+
+
+class FakeStream:
+
+    def __init__(self, channel, lines=()):
+        self.channel = channel
+        self.lines = list(lines)
+
+    def readlines(self):
+        return self.lines
+
+
+class FakeClient:
+    """Stands in for a paramiko SSHClient with a single scripted command."""
+
+    def __init__(self, chunks=(), exit_status=0, stderr=()):
+        self.channel = FakeChannel(chunks, exit_status)
+        self.stderr = stderr
+        self.stdin = None
+        self.calls = []
+
+    def exec_command(self, call, **kwargs):
+        self.calls.append(call)
+        self.stdin = FakeStdin(self.channel)
+        return (self.stdin, FakeStream(self.channel),
+                FakeStream(self.channel, self.stderr))
+
+
+@pytest.fixture
+def fake_client():
+    return FakeClient
+
+
+class FakeSFTP:
+    """Stands in for a paramiko SFTPClient, serving the local file system."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def listdir_attr(self, path):
+        return [paramiko.SFTPAttributes.from_stat(
+                    os.stat(os.path.join(path, fn)), fn)
+                for fn in sorted(os.listdir(path))]
+
+    def lstat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.lstat(path))
+
+    def stat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.stat(path))
+
+    def put(self, local_path, remote_path):
+        shutil.copyfile(local_path, remote_path)
+        self.sent.append((local_path, remote_path))
+
+    def get(self, remote_path, local_path, **kwargs):
+        shutil.copyfile(remote_path, local_path)
+        self.sent.append((remote_path, local_path))
+
+    def utime(self, path, times):
+        os.utime(path, times)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSFTPOpener:
+    """Replaces pmkutils._open_sftp, recording every session it opens. Once
+    limit sessions are open at the same time, further sessions are refused
+    as sshd does at MaxSessions."""
+
+    def __init__(self, limit=None):
+        self.opened = []
+        self.limit = limit
+        self.refused = 0
+
+    def __call__(self, client, **kwargs):
+        open_now = [conn for conn in self.opened if not conn.closed]
+        if self.limit is not None and len(open_now) >= self.limit:
+            self.refused += 1
+            raise paramiko.ssh_exception.ChannelException(
+                1, 'Administratively prohibited')
+        self.opened.append(FakeSFTP())
+        return self.opened[-1]
+
+    def sent(self):
+        return sorted(tup for conn in self.opened for tup in conn.sent)
+
+
+@pytest.fixture
+def fake_sftp(monkeypatch):
+    """Route pmkutils' SFTP sessions and commands to the local machine."""
+    opener = FakeSFTPOpener()
+
+    def run(client, call):
+        subprocess.run(call, shell=True, check=True)
+
+    monkeypatch.setattr(pmkutils, '_open_sftp', opener)
+    monkeypatch.setattr(pmkutils, 'pmk_cmd', run)
+    return opener
@@ -0,0 +1,32 @@
+import pytest
+
+from rcluster.pmkutils import pmk_cmd
+
+text = 'naïve café ✓\n'
+
+
+def test_multibyte_split_across_reads(fake_client):
+    data = text.encode('utf-8')
+    # Split inside the two-byte 'ï' and the three-byte check mark
+    cuts = [3, data.index('✓'.encode('utf-8')) + 1]
+    chunks = [data[:cuts[0]], data[cuts[0]:cuts[1]], data[cuts[1]:]]
+    client = fake_client(chunks)
+    assert pmk_cmd(client, 'echo') == text
+
+
+def test_no_capture(fake_client):
+    client = fake_client([text.encode('utf-8')])
+    assert pmk_cmd(client, 'echo', capture=False) == ''
+
+
+def test_stdin(fake_client):
+    client = fake_client()
+    pmk_cmd(client, 'cat', stdin_data=b'script')
+    assert client.stdin.getvalue() == b'script'
+    assert client.channel.write_shut
+
+
+def test_failure(fake_client):
+    client = fake_client([b'partial'], exit_status=1, stderr=['bad call\n'])
+    with pytest.raises(Exception, match='bad call'):
+        pmk_cmd(client, 'false')
@@ -0,0 +1,88 @@
+import socket
+
+import paramiko
+import pytest
+
+from rcluster import pmkutils
+from rcluster.pmkutils import pmk_connect
+
+
+class _Errors(list):
+    closes = 0
+
+
+@pytest.fixture
+def connect_errors(monkeypatch):
+    """Make SSHClient.connect raise the queued errors, then succeed; counts
+    SSHClient.close calls."""
+    errors = _Errors()
+
+    def connect(self, **kwargs):
+        if errors:
+            raise errors.pop(0)
+
+    def close(self):
+        errors.closes += 1
+
+    monkeypatch.setattr(paramiko.SSHClient, 'connect', connect)
+    monkeypatch.setattr(paramiko.SSHClient, 'close', close)
+    monkeypatch.setattr(pmkutils, '_backoff', lambda *args: None)
+    return errors
+
+
+def test_connect_retries_timeouts(connect_errors):
+    connect_errors.extend([socket.timeout('timed out'),
+                           ConnectionRefusedError()])
+    client = pmk_connect('host', None, pkey=object())
+    assert isinstance(client, paramiko.SSHClient)
+    assert connect_errors == []
+    # Each failed attempt is cleaned up before the next
+    assert connect_errors.closes == 2
+
+
+def test_connect_gives_up(connect_errors):
+    connect_errors.extend([socket.timeout('timed out')] * 3)
+    with pytest.raises(socket.timeout):
+        pmk_connect('host', None, pkey=object(), max_attempts=3)
+    assert connect_errors.closes == 3
+
+
+def test_connect_auth_fails_fast(connect_errors):
+    connect_errors.extend([paramiko.ssh_exception.AuthenticationException(),
+                           None])
+    with pytest.raises(paramiko.ssh_exception.AuthenticationException):
+        pmk_connect('host', None, pkey=object())
+    assert connect_errors == [None]
+
+
+class _Client:
+
+    def __init__(self, host):
+        self.host = host
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_connect_many_closes_on_error(monkeypatch):
+    clients = []
+
+    def connect(host, **kwargs):
+        if host == 'bad':
+            raise paramiko.ssh_exception.SSHException('no banner')
+        clients.append(_Client(host))
+        return clients[-1]
+
+    monkeypatch.setattr(pmkutils, 'pmk_connect', connect)
+    with pytest.raises(paramiko.ssh_exception.SSHException):
+        pmkutils.pmk_connect_many(['a', 'bad', 'b'], None)
+    assert sorted(client.host for client in clients) == ['a', 'b']
+    assert all(client.closed for client in clients)
+
+
+def test_connect_many_order(monkeypatch):
+    monkeypatch.setattr(pmkutils, 'pmk_connect',
+                        lambda host, **kwargs: _Client(host))
+    clients = pmkutils.pmk_connect_many(['a', 'b', 'c'], None)
+    assert [client.host for client in clients] == ['a', 'b', 'c']
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from rcluster.pmkutils import pmk_get
+
+
+@pytest.fixture
+def remote_tree(tmp_path):
+    source = tmp_path / 'remote'
+    (source / 'sub').mkdir(parents=True)
+    (source / 'empty').mkdir()
+    (source / 'a.txt').write_text('a')
+    (source / 'sub' / 'b.txt').write_text('bb')
+    return source
+
+
+def test_get_skips_current(fake_sftp, remote_tree, tmp_path):
+    local = tmp_path / 'local'
+    pmk_get(None, str(remote_tree), str(local))
+    assert len(fake_sftp.sent()) == 2
+    assert ((local / 'sub' / 'b.txt').stat().st_mtime ==
+            (remote_tree / 'sub' / 'b.txt').stat().st_mtime)
+
+    fake_sftp.opened.clear()
+    pmk_get(None, str(remote_tree), str(local))
+    assert fake_sftp.sent() == []
+
+    # Same size, different mtime: must be retrieved again
+    changed = remote_tree / 'sub' / 'b.txt'
+    changed.write_text('cc')
+    os.utime(changed, (0, 1000))
+    fake_sftp.opened.clear()
+    pmk_get(None, str(remote_tree), str(local))
+    assert fake_sftp.sent() == [(str(changed), str(local / 'sub' / 'b.txt'))]
+    assert (local / 'sub' / 'b.txt').read_text() == 'cc'
+
+
+def test_get_force(fake_sftp, remote_tree, tmp_path):
+    local = tmp_path / 'local'
+    pmk_get(None, str(remote_tree), str(local))
+    fake_sftp.opened.clear()
+    pmk_get(None, str(remote_tree), str(local), force=True)
+    assert len(fake_sftp.sent()) == 2
+
+
+def test_get_missing_source(fake_sftp, tmp_path):
+    pmk_get(None, str(tmp_path / 'missing'), str(tmp_path / 'local'))
+    assert fake_sftp.sent() == []
+    assert all(conn.closed for conn in fake_sftp.opened)
+
+
+def test_get_closes_sessions_on_error(fake_sftp, remote_tree, tmp_path):
+    # A file where the target directory should be makes os.makedirs fail
+    local = tmp_path / 'local'
+    local.write_text('')
+    with pytest.raises(OSError):
+        pmk_get(None, str(remote_tree), str(local))
+    assert len(fake_sftp.opened) > 1
+    assert all(conn.closed for conn in fake_sftp.opened)
+
+
+@pytest.mark.parametrize("suffix", ["", "/"], ids=["bare", "trailing-slash"])
+def test_get_targets(fake_sftp, remote_tree, tmp_path, suffix):
+    local = tmp_path / 'local'
+    pmk_get(None, str(remote_tree) + suffix, str(local))
+    assert sorted(target for _, target in fake_sftp.sent()) == [
+        str(local / 'a.txt'), str(local / 'sub' / 'b.txt')]
+    assert (local / 'sub' / 'b.txt').read_text() == 'bb'
+
+
+def test_get_without_fan_out_opens_one_session(fake_sftp, tmp_path):
+    remote = tmp_path / 'remote'
+    (remote / 'only').mkdir(parents=True)
+    (remote / 'only' / 'c.txt').write_text('c')
+    pmk_get(None, str(remote), str(tmp_path / 'local'))
+    assert len(fake_sftp.opened) == 1
+    assert (tmp_path / 'local' / 'only' / 'c.txt').read_text() == 'c'
+
+
+def test_get_runs_with_refused_sessions(fake_sftp, tmp_path):
+    remote = tmp_path / 'remote'
+    for i in range(6):
+        (remote / str(i)).mkdir(parents=True)
+        (remote / str(i) / 'f.txt').write_text(str(i))
+    fake_sftp.limit = 3
+    pmk_get(None, str(remote), str(tmp_path / 'local'))
+    assert len(fake_sftp.sent()) == 6
+    assert len(fake_sftp.opened) == 3
+    # Refused once while walking; the mover then stops at its first refusal
+    assert fake_sftp.refused == 2
+    assert all(conn.closed for conn in fake_sftp.opened)
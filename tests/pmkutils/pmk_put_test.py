@@ -0,0 +1,196 @@
+import io
+import os
+import tarfile
+from queue import Empty
+from types import SimpleNamespace
+
+import paramiko
+import pytest
+
+from rcluster import pmkutils
+from rcluster.pmkutils import _is_current, _pmk_mover, _top_up, _walk_files, \
+    pmk_put, pmk_put_tar
+
+
+@pytest.fixture
+def local_tree(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'sub').mkdir(parents=True)
+    (source / 'a.txt').write_text('a')
+    (source / 'sub' / 'b.txt').write_text('bb')
+    return source
+
+
+def test_put_tar_members(fake_client, local_tree):
+    client = fake_client()
+    pmk_put_tar(client, str(local_tree), '/shared')
+    assert client.calls == ['mkdir -p /shared && tar xzf - -C /shared']
+    assert client.channel.write_shut
+    with tarfile.open(fileobj=io.BytesIO(client.stdin.getvalue())) as tar:
+        names = tar.getnames()
+    assert '.' not in names
+    assert sorted(names) == ['a.txt', 'sub', 'sub/b.txt']
+
+
+def test_put_tar_failure(fake_client, local_tree):
+    client = fake_client(exit_status=2, stderr=['tar: failed\n'])
+    with pytest.raises(Exception, match='tar: failed'):
+        pmk_put_tar(client, str(local_tree), '/shared')
+
+
+def _attr(size, mtime):
+    return SimpleNamespace(st_size=size, st_mtime=mtime)
+
+
+@pytest.mark.parametrize("source, target, expected", [
+    (_attr(3, 100.5), _attr(3, 100), True),
+    (_attr(3, 100), _attr(3, 101), False),
+    (_attr(3, 101), _attr(3, 100), False),
+    (_attr(3, 100), _attr(4, 100), False),
+    (_attr(3, 100), None, False),
+    (None, _attr(3, 100), False),
+], ids=["same", "target-newer", "target-older", "size", "no-target",
+        "no-source"])
+def test_is_current(source, target, expected):
+    assert _is_current(source, target) is expected
+
+
+def test_put_skips_current(fake_sftp, local_tree, tmp_path):
+    remote = tmp_path / 'remote'
+    pmk_put(None, str(local_tree), str(remote))
+    assert len(fake_sftp.sent()) == 2
+    assert ((remote / 'sub' / 'b.txt').stat().st_mtime ==
+            (local_tree / 'sub' / 'b.txt').stat().st_mtime)
+
+    fake_sftp.opened.clear()
+    pmk_put(None, str(local_tree), str(remote))
+    assert fake_sftp.sent() == []
+
+    # Same size, different mtime: must be sent again
+    changed = local_tree / 'sub' / 'b.txt'
+    changed.write_text('cc')
+    os.utime(changed, (0, 1000))
+    fake_sftp.opened.clear()
+    pmk_put(None, str(local_tree), str(remote))
+    assert fake_sftp.sent() == [(str(changed),
+                                 str(remote / 'sub' / 'b.txt'))]
+    assert (remote / 'sub' / 'b.txt').read_text() == 'cc'
+
+
+def test_put_force(fake_sftp, local_tree, tmp_path):
+    remote = tmp_path / 'remote'
+    pmk_put(None, str(local_tree), str(remote))
+    fake_sftp.opened.clear()
+    pmk_put(None, str(local_tree), str(remote), force=True)
+    assert len(fake_sftp.sent()) == 2
+
+
+def test_put_closes_sessions_on_error(fake_sftp, local_tree, tmp_path,
+                                      monkeypatch):
+    remote = tmp_path / 'remote'
+    pmk_put(None, str(local_tree), str(remote))
+
+    def fail(client, call):
+        raise Exception('mkdir failed')
+
+    (local_tree / 'new').mkdir()
+    (local_tree / 'new' / 'c.txt').write_text('c')
+    fake_sftp.opened.clear()
+    monkeypatch.setattr(pmkutils, 'pmk_cmd', fail)
+    with pytest.raises(Exception, match='mkdir failed'):
+        pmk_put(None, str(local_tree), str(remote))
+    assert fake_sftp.opened
+    assert all(conn.closed for conn in fake_sftp.opened)
+
+
+@pytest.mark.parametrize("suffix", ["", "/"], ids=["bare", "trailing-slash"])
+def test_walk_files_relative(local_tree, suffix):
+    top = str(local_tree) + suffix
+    files = sorted(_walk_files(os.walk(top), top))
+    assert files == [(str(local_tree / 'a.txt'), 'a.txt'),
+                     (str(local_tree / 'sub' / 'b.txt'), 'sub/b.txt')]
+
+
+@pytest.mark.parametrize("suffix", ["", "/"], ids=["bare", "trailing-slash"])
+def test_put_targets(fake_sftp, local_tree, tmp_path, suffix):
+    remote = tmp_path / 'remote'
+    pmk_put(None, str(local_tree) + suffix, str(remote))
+    assert sorted(target for _, target in fake_sftp.sent()) == [
+        str(remote / 'a.txt'), str(remote / 'sub' / 'b.txt')]
+
+
+@pytest.mark.parametrize("threaded", [True, False])
+def test_mover_pool(fake_sftp, threaded):
+    moved = []
+
+    def move(sftp_conn, file_queue):
+        while True:
+            try:
+                moved.append(file_queue.get_nowait())
+            except Empty:
+                return
+
+    pooled = fake_sftp(None)
+    files = [(str(i), str(i)) for i in range(5)]
+    _pmk_mover(move, None, files, threaded=threaded, thread_cap=3,
+               sftp_pool=[pooled])
+    assert sorted(moved) == files
+    # The pooled session is reused, topped up to thread_cap when threaded
+    assert len(fake_sftp.opened) == (3 if threaded else 1)
+    assert all(conn.closed for conn in fake_sftp.opened)
+
+
+def test_mover_closes_pool_on_error(fake_sftp):
+    def move(sftp_conn, file_queue):
+        raise IOError('transfer failed')
+
+    with pytest.raises(IOError):
+        _pmk_mover(move, None, [('a', 'a'), ('b', 'b')], threaded=True,
+                   thread_cap=2)
+    assert len(fake_sftp.opened) == 2
+    assert all(conn.closed for conn in fake_sftp.opened)
+
+
+def test_mover_runs_with_refused_sessions(fake_sftp):
+    moved = []
+
+    def move(sftp_conn, file_queue):
+        while True:
+            try:
+                moved.append(file_queue.get_nowait())
+            except Empty:
+                return
+
+    fake_sftp.limit = 3
+    files = [(str(i), str(i)) for i in range(20)]
+    _pmk_mover(move, None, files, threaded=True, thread_cap=10)
+    assert sorted(moved) == sorted(files)
+    assert len(fake_sftp.opened) == 3
+    assert fake_sftp.refused == 1
+    assert all(conn.closed for conn in fake_sftp.opened)
+
+
+def test_mover_needs_one_session(fake_sftp):
+    fake_sftp.limit = 0
+    with pytest.raises(paramiko.ssh_exception.ChannelException):
+        _pmk_mover(None, None, [('a', 'a')], threaded=True, thread_cap=10)
+
+
+def test_top_up_single_attempt_when_optional(monkeypatch):
+    calls = []
+
+    def refuse(transport, **kwargs):
+        calls.append(transport)
+        raise paramiko.ssh_exception.ChannelException(
+            1, 'Administratively prohibited')
+
+    monkeypatch.setattr(paramiko.SFTPClient, 'from_transport', refuse)
+    monkeypatch.setattr(pmkutils, '_backoff', lambda *args: None)
+    client = SimpleNamespace(get_transport=lambda: 'transport')
+    pool = ['open']
+    assert not _top_up(client, pool, 3)
+    assert pool == ['open'] and len(calls) == 1
+    with pytest.raises(paramiko.ssh_exception.ChannelException):
+        _top_up(client, [], 3)
+    # The first session is retried as _open_sftp does by default
+    assert len(calls) == 11
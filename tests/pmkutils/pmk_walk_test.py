@@ -0,0 +1,46 @@
+import pytest
+
+from rcluster.pmkutils import pmk_walk
+
+
+@pytest.fixture
+def remote_tree(tmp_path):
+    root = tmp_path / 'remote'
+    (root / 'x' / 'deep').mkdir(parents=True)
+    (root / 'y').mkdir()
+    (root / 'top.txt').write_text('t')
+    (root / 'x' / 'deep' / 'z.txt').write_text('z')
+    return root
+
+
+@pytest.mark.parametrize("pool_size", [0, 2], ids=["serial", "parallel"])
+def test_walk_breadth_first(fake_sftp, remote_tree, pool_size):
+    root = str(remote_tree)
+    pool = [fake_sftp(None) for _ in range(pool_size)]
+    walked = list(pmk_walk(fake_sftp(None), root, pool))
+    assert walked == [
+        (root, ['x', 'y'], ['top.txt']),
+        (root + '/x', ['deep'], []),
+        (root + '/y', [], []),
+        (root + '/x/deep', [], ['z.txt']),
+    ]
+
+
+def test_walk_missing_root(fake_sftp, tmp_path):
+    with pytest.raises(IOError, match='No such file'):
+        list(pmk_walk(fake_sftp(None), str(tmp_path / 'missing')))
+
+
+def test_walk_grows_on_fan_out(fake_sftp, remote_tree):
+    root = str(remote_tree)
+    wanted = []
+
+    def grow(n):
+        wanted.append(n)
+        return [fake_sftp(None) for _ in range(n)]
+
+    walked = list(pmk_walk(fake_sftp(None), root, grow=grow))
+    assert [folder for folder, _, _ in walked] == [
+        root, root + '/x', root + '/y', root + '/x/deep']
+    # Only the second level (x and y) has more directories than sessions
+    assert wanted == [1]
@@ -0,0 +1,212 @@
+import json
+import subprocess
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+import rcluster
+from rcluster import ConfigMissingError, RCluster
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    # Preset key, security group and placement group keep __init__ offline
+    return RCluster('access', 'secret', 'us-east-1',
+                    {'ImageId': 'ami-1', 'SecurityGroups': ['test'],
+                     'Placement': {'GroupName': 'test'}},
+                    key_path=str(tmp_path / 'test.pem'), ver='test')
+
+
+def test_write_config_after_mutation(cluster, tmp_path):
+    fn = str(tmp_path / 'config.json')
+    cluster.write_config(fn)
+    cluster.instance_conf['ImageId'] = 'ami-2'
+    cluster.write_config(fn)
+    with open(fn) as f:
+        assert json.load(f)['instance_conf']['ImageId'] == 'ami-2'
+
+
+def test_snapshot_after_mutation(cluster):
+    cluster.snapshot()
+    cluster.instance_conf['ImageId'] = 'ami-2'
+    snap = cluster.snapshot()
+    assert snap['instance_conf']['ImageId'] == 'ami-2'
+    snap['instance_conf']['ImageId'] = 'ami-3'
+    assert cluster.instance_conf['ImageId'] == 'ami-2'
+
+
+@pytest.fixture
+def templated(cluster):
+    cluster.ec2 = mock.MagicMock()
+    client = cluster.ec2.meta.client
+    client.create_launch_template_version.side_effect = [
+        {'LaunchTemplateVersion': {'VersionNumber': n}} for n in (2, 3)
+    ]
+    cluster.launch_template_id = 'lt-1'
+    return cluster
+
+
+def _launch_conf(cluster):
+    return cluster.ec2.create_instances.call_args.kwargs
+
+
+def test_launch_template_versioned_on_change(templated):
+    client = templated.ec2.meta.client
+    templated.create_instances(1)
+    assert _launch_conf(templated)['LaunchTemplate']['Version'] == '2'
+    templated.create_instances(1)
+    assert client.create_launch_template_version.call_count == 1
+    templated.instance_conf['ImageId'] = 'ami-2'
+    templated.create_instances(1)
+    assert _launch_conf(templated)['LaunchTemplate']['Version'] == '3'
+    data = client.create_launch_template_version.call_args.kwargs[
+        'LaunchTemplateData']
+    assert data['ImageId'] == 'ami-2'
+
+
+def test_launch_template_versioned_on_nested_change(templated):
+    templated.create_instances(1)
+    templated.instance_conf['Placement']['GroupName'] = 'other'
+    templated.create_instances(1)
+    assert _launch_conf(templated)['LaunchTemplate']['Version'] == '3'
+
+
+def test_launch_template_bypassed_for_removed_setting(templated):
+    templated.create_instances(1, Placement=None)
+    conf = _launch_conf(templated)
+    assert 'LaunchTemplate' not in conf
+    assert 'Placement' not in conf
+    assert conf['ImageId'] == 'ami-1'
+
+
+def _instance(cpu_options):
+    return SimpleNamespace(instance_id='i-1', private_ip_address='10.0.0.1',
+                           cpu_options=cpu_options)
+
+
+@pytest.fixture
+def remote_cpus(cluster, monkeypatch):
+    """Stub out SSH so CPU counts come from cpu_count (2) or nproc (3)."""
+    commands = []
+
+    def pmk_cmd(client, call):
+        commands.append(call)
+        return '3\n'
+
+    monkeypatch.setattr(cluster, 'connect', lambda instance: object())
+    monkeypatch.setattr(rcluster, 'cpu_count', lambda client: 2)
+    monkeypatch.setattr(rcluster, 'pmk_cmd', pmk_cmd)
+    return commands
+
+
+def test_cpus_from_cpu_options(cluster, remote_cpus):
+    instance = _instance({'CoreCount': 4, 'ThreadsPerCore': 1})
+    assert cluster._configure_instance(instance) == ('10.0.0.1', 4)
+    assert cluster._configure_instance(instance, 'start') == ('10.0.0.1', 4)
+    assert remote_cpus == ['start']
+
+
+def test_cpus_fall_back_to_remote(cluster, remote_cpus):
+    instance = _instance(None)
+    assert cluster._configure_instance(instance) == ('10.0.0.1', 2)
+    assert cluster._configure_instance(instance, 'start') == ('10.0.0.1', 3)
+    assert remote_cpus == ['nproc --all && {\nstart\n}']
+
+
+@pytest.mark.parametrize("runtime", [
+    'echo ran; echo more',
+    'false || echo ran',
+    'echo ran &',
+    'echo ran # trailing comment',
+])
+def test_cpus_counted_before_runtime_output(cluster, monkeypatch, runtime):
+    def pmk_cmd(client, call):
+        return subprocess.run(['bash', '-c', call], stdout=subprocess.PIPE,
+                              check=True, universal_newlines=True).stdout
+
+    monkeypatch.setattr(cluster, 'connect', lambda instance: object())
+    monkeypatch.setattr(rcluster, 'pmk_cmd', pmk_cmd)
+    nproc = int(subprocess.check_output(['nproc', '--all']))
+    assert cluster._configure_instance(_instance(None), runtime) == \
+        ('10.0.0.1', nproc)
+
+
+@pytest.fixture
+def config_fn(cluster, tmp_path):
+    fn = str(tmp_path / 'config.json')
+    cluster.write_config(fn)
+    with open(fn) as f:
+        conf = json.load(f)
+    conf['aws_access_key_id'] = None
+    conf['aws_secret_access_key'] = None
+    with open(fn, 'w') as f:
+        json.dump(conf, f)
+    return fn
+
+
+def test_from_config_missing_keys(config_fn):
+    with pytest.raises(ConfigMissingError) as exc:
+        RCluster.from_config(config_fn, interactive=False)
+    assert sorted(exc.value.keys) == ['aws_access_key_id',
+                                      'aws_secret_access_key']
+    assert 'aws_access_key_id' in str(exc.value)
+    assert 'aws_secret_access_key' in str(exc.value)
+    assert isinstance(exc.value, ValueError)
+
+
+def test_from_config_prompts(config_fn, monkeypatch):
+    prompts = []
+
+    def answer(prompt):
+        prompts.append(prompt)
+        return 'typed'
+
+    monkeypatch.setattr('builtins.input', answer)
+    loaded = RCluster.from_config(config_fn, aws_access_key_id='given')
+    assert prompts == ['aws_secret_access_key: ']
+    assert loaded.aws_access_key_id == 'given'
+    assert loaded.aws_secret_access_key == 'typed'
+    assert loaded.instance_conf['ImageId'] == 'ami-1'
+
+
+def test_from_config_complete(config_fn):
+    loaded = RCluster.from_config(config_fn, interactive=False,
+                                  aws_access_key_id='access',
+                                  aws_secret_access_key='secret')
+    assert loaded.ver == 'test'
+    # Optional values saved as null stay unset rather than being required
+    assert loaded.launch_template_id is None
+    assert loaded.manager_runtime is None
+
+
+def test_config_round_trip_non_ascii(cluster, tmp_path):
+    fn = str(tmp_path / 'config.json')
+    cluster.worker_runtime = 'echo "café ✓"'
+    cluster.write_config(fn)
+    with open(fn, 'rb') as f:
+        assert json.loads(f.read().decode('utf-8'))['worker_runtime'] == \
+            'echo "café ✓"'
+    loaded = RCluster.from_config(fn, interactive=False)
+    assert loaded.worker_runtime == 'echo "café ✓"'
+
+
+def test_create_ami_streams_script(cluster, tmp_path, monkeypatch):
+    # Longer than one argv string may be (128 KiB), reads stdin, and ends in
+    # a heredoc without a trailing newline
+    script = tmp_path / 'setup.sh'
+    script.write_text('echo start\ncat\n' + '# padding\n' * 20000 +
+                      'cat <<EOF\nend\nEOF')
+    runs = []
+
+    def pmk_cmd(client, call, stdin_data=None, capture=True):
+        assert call == 'sudo bash -s'
+        runs.append(subprocess.run(['bash', '-s'], input=stdin_data,
+                                   stdout=subprocess.PIPE, check=True))
+
+    cluster.ec2 = mock.MagicMock()
+    monkeypatch.setattr(cluster, 'connect', lambda instance: object())
+    monkeypatch.setattr(rcluster, 'pmk_cmd', pmk_cmd)
+    cluster.create_ami(base=mock.MagicMock(), setup_fn=str(script),
+                       update_image=False)
+    assert runs[0].stdout == b'start\nend\n'